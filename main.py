@@ -1,10 +1,15 @@
 import os
-import json
 import time
+import bisect
+import contextlib
 import uuid
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
+import orjson
+import aiofiles
 
 try:
     from database import db, create_document
@@ -12,13 +17,24 @@ except Exception:  # If database module fails for any reason
     db = None
     create_document = None
 
-from schemas import Job, Clip
+try:
+    from bson.objectid import ObjectId
+    from pymongo import ReturnDocument
+except Exception:  # bson ships with pymongo; only needed on the DB path
+    ObjectId = None
+    ReturnDocument = None
+
+from schemas import Clip
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Comma-separated list of frontend origins; a concrete list lets CORS take the
+# plain string-compare path instead of reflecting every Origin header
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -26,36 +42,132 @@ app.add_middleware(
 
 # Fallback in-memory store when DB env is not configured
 MEM_STORE_ENABLED = db is None
-_mem_jobs: Dict[str, Dict[str, Any]] = {}
+# Struct-of-arrays layout: one list per job field, indexed by integer job id
+_MEM_FIELDS = (
+    'status', 'progress', 'message',
+    'source_type', 'original_filename', 'upload_path', 'sources',
+    'clip_length', 'aspect_ratio', 'auto_highlights',
+    'clips', 'error', 'created_ns',
+)
+_mem_cols: Dict[str, List[Any]] = {field: [] for field in _MEM_FIELDS}
+# Ids start from the boot time in microseconds so they are never reused after a
+# restart; completed /status responses are cached by clients as immutable
+_job_count = time.time_ns() // 1000
+
+# Memory jobs expire an hour after completion. Ids and expiry times both grow
+# with insertion order, so expired jobs always form a prefix of the columns.
+# Expiry only advances _mem_head; the dead prefix is sliced off once it makes
+# up more than half of the columns, keeping eviction amortized O(1) per job.
+MEM_JOB_TTL_NS = 3600 * 1_000_000_000
+_mem_expires_ns: List[int] = []
+_mem_base = _job_count  # job id stored at column index 0
+_mem_head = 0  # column index of the oldest live job
+
+
+def _mem_evict_expired():
+    global _mem_base, _mem_head
+    end = bisect.bisect_right(_mem_expires_ns, time.monotonic_ns(), lo=_mem_head)
+    if end == _mem_head:
+        return
+    for idx in range(_mem_head, end):
+        path = _mem_cols['upload_path'][idx]
+        if path:
+            _discard_upload(path)
+        _completed_jobs.pop(str(_mem_base + idx), None)
+        for field in _MEM_FIELDS:
+            _mem_cols[field][idx] = None
+    _mem_head = end
+    if _mem_head > len(_mem_expires_ns) // 2:
+        del _mem_expires_ns[:_mem_head]
+        for col in _mem_cols.values():
+            del col[:_mem_head]
+        _mem_base += _mem_head
+        _mem_head = 0
+
+
+def parse_job_id(job_id: str) -> Optional[Any]:
+    """Parse a public job id into the store key once, or None if malformed."""
+    if db is not None:
+        return ObjectId(job_id) if ObjectId.is_valid(job_id) else None
+    _mem_evict_expired()
+    if not job_id.isdecimal():
+        return None
+    jid = int(job_id)
+    return jid if _mem_base + _mem_head <= jid < _job_count else None
+
+
+def _mem_row(jid: int, fields=_MEM_FIELDS) -> Dict[str, Any]:
+    idx = jid - _mem_base
+    row = {field: _mem_cols[field][idx] for field in fields if field in _mem_cols}
+    row['_id'] = str(jid)
+    return row
+
+
+def _mem_update(jid: int, updates: Dict[str, Any]):
+    idx = jid - _mem_base
+    for field, value in updates.items():
+        _mem_cols[field][idx] = value
+
+
+# Completed jobs never change again, so repeat polls are served from the
+# already-encoded response body kept here
+COMPLETED_CACHE_SIZE = 10_000
+_completed_jobs: "OrderedDict[str, bytes]" = OrderedDict()
+
+
+def _cache_get(job_id: str) -> Optional[bytes]:
+    body = _completed_jobs.get(job_id)
+    if body is not None:
+        _completed_jobs.move_to_end(job_id)
+    return body
+
+
+def _cache_put(job_id: str, body: bytes):
+    _completed_jobs[job_id] = body
+    _completed_jobs.move_to_end(job_id)
+    if len(_completed_jobs) > COMPLETED_CACHE_SIZE:
+        _completed_jobs.popitem(last=False)
 
 
-def save_job(doc: Dict[str, Any]) -> str:
+async def save_job(doc: Dict[str, Any]) -> str:
     """Save job to DB if available, else memory, and return job_id."""
     if db is not None:
         # Mongo path
-        from bson.objectid import ObjectId  # import locally to avoid dependency when no DB
-        _id = db['job'].insert_one(doc).inserted_id
+        _id = (await db['job'].insert_one(doc)).inserted_id
         return str(_id)
     # Memory path
-    jid = uuid.uuid4().hex
-    _mem_jobs[jid] = {**doc, "_id": jid}
+    global _job_count
+    _mem_evict_expired()
+    for field in _MEM_FIELDS:
+        _mem_cols[field].append(doc.get(field))
+    _mem_expires_ns.append(time.monotonic_ns() + PROCESS_NS + MEM_JOB_TTL_NS)
+    jid = str(_job_count)
+    _job_count += 1
     return jid
 
 
-def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+async def get_job(key: Any, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """Fetch a job by the key returned from parse_job_id."""
     if db is not None:
-        from bson.objectid import ObjectId
-        return db['job'].find_one({"_id": ObjectId(job_id)})
-    return _mem_jobs.get(job_id)
+        return await db['job'].find_one({"_id": key}, projection)
+    return _mem_row(key, projection or _MEM_FIELDS)
 
 
-def update_job(job_id: str, updates: Dict[str, Any]):
+async def atomic_status_update(
+    key: Any,
+    updates: Dict[str, Any],
+    projection: Optional[Dict[str, int]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Apply updates and return the updated job in a single round-trip."""
     if db is not None:
-        from bson.objectid import ObjectId
-        db['job'].update_one({"_id": ObjectId(job_id)}, {"$set": updates})
-        return
-    if job_id in _mem_jobs:
-        _mem_jobs[job_id].update(updates)
+        return await db['job'].find_one_and_update(
+            {"_id": key},
+            {"$set": updates},
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+    _mem_update(key, updates)
+    return _mem_row(key, projection or _MEM_FIELDS)
 
 
 @app.get("/")
@@ -64,20 +176,102 @@ def read_root():
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     status = {
         "backend": "✅ Running",
         "database": "✅ Connected" if db is not None else "❌ Not Configured (using in-memory jobs)",
         "database_url": "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set",
         "database_name": "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set",
         "connection_status": "Connected" if db is not None else "Not Connected",
-        "collections": db.list_collection_names() if db is not None else ["(memory) job"],
+        "collections": await db.list_collection_names() if db is not None else ["(memory) job"],
     }
     return status
 
 
 # Demo processing timeline (in seconds)
 PROCESS_SECONDS = 10
+PROCESS_NS = PROCESS_SECONDS * 1_000_000_000
+
+# Fields /status actually reads; keeps the poll payload small
+_STATUS_PROJECTION = {
+    'created_ns': 1,
+    'created_ts': 1,
+    'status': 1,
+    'progress': 1,
+    'message': 1,
+    'clips': 1,
+    'aspect_ratio': 1,
+    'clip_length': 1,
+}
+
+
+def _created_ns(doc: Dict[str, Any], now_ns: int) -> int:
+    created_ns = doc.get('created_ns')
+    if created_ns is not None:
+        return created_ns
+    # Jobs written before created_ns only carry float seconds in created_ts
+    created_ts = doc.get('created_ts')
+    return int(created_ts * 1_000_000_000) if created_ts is not None else now_ns
+
+
+# Demo clips returned on completion; only duration and aspect_ratio vary per job
+_CLIP_TEMPLATES = [
+    Clip(
+        caption='Top moment with highest energy',
+        thumbnail_url='https://images.unsplash.com/photo-1504384308090-c894fdcc538d?q=80&w=1280&auto=format&fit=crop',
+        download_url='https://file-examples.com/storage/fe0e7a8f6e2a6a5ef2d3b5f/2017/04/file_example_MP4_480_1_5MG.mp4',
+    ).model_dump(),
+    Clip(
+        caption='Funny reaction with clean transcript',
+        thumbnail_url='https://images.unsplash.com/photo-1524253482453-3fed8d2fe12b?q=80&w=1280&auto=format&fit=crop',
+        download_url='https://file-examples.com/storage/fe0e7a8f6e2a6a5ef2d3b5f/2017/04/file_example_MP4_1280_10MG.mp4',
+    ).model_dump(),
+]
+
+
+def _clip_duration(clip_length: Optional[str]) -> Optional[float]:
+    """Resolve the requested clip length to seconds ('auto' means 30)."""
+    if clip_length == 'auto':
+        return 30.0
+    try:
+        return float(clip_length)
+    except (TypeError, ValueError):
+        return None
+
+
+# Accepted spellings of a true auto_highlights form value
+_TRUTHY = frozenset({
+    'true', 'True', 'TRUE',
+    '1',
+    'yes', 'Yes', 'YES',
+    'on', 'On', 'ON',
+})
+
+# Uploaded source files are streamed here rather than held in memory. Memory-store
+# jobs delete their file when they expire; with a database configured the files
+# outlive the job and must be cleaned up by whatever consumes them.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def _upload_suffix(filename: Optional[str]) -> str:
+    """Keep the client's extension only if it is short and plain alphanumeric."""
+    ext = os.path.splitext(filename or '')[1]
+    if len(ext) <= 16 and ext[1:].isascii() and ext[1:].isalnum():
+        return ext
+    return ''
+
+
+def _discard_upload(path: str):
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+async def _spool_upload(file: UploadFile, dst: str, chunk: int = UPLOAD_CHUNK_SIZE):
+    """Copy an upload to dst in fixed-size chunks."""
+    async with aiofiles.open(dst, 'wb') as f:
+        while chunk_bytes := await file.read(chunk):
+            await f.write(chunk_bytes)
 
 
 @app.post("/process")
@@ -90,102 +284,149 @@ async def process(
     auto_highlights: str = Form("true"),
 ):
     # Validate at least one input
-    link_list = []
+    # dict keys act as an insertion-ordered set: O(1) membership, duplicates dropped
+    link_set: Dict[str, None] = {}
     if sources:
         try:
-            parsed = json.loads(sources)
+            parsed = orjson.loads(sources)
             if isinstance(parsed, list):
-                link_list = [str(x) for x in parsed if isinstance(x, str)]
+                link_set = dict.fromkeys(x for x in parsed if isinstance(x, str))
         except Exception:
             pass
-    if source_url and source_url not in link_list:
-        link_list.append(source_url)
+    if source_url:
+        link_set[source_url] = None
 
-    if not file and len(link_list) == 0:
+    if not file and not link_set:
         raise HTTPException(status_code=400, detail="Provide a file or at least one link")
 
     source_type = 'file' if file else 'links'
-    auto_h = str(auto_highlights).lower() in ("true", "1", "yes", "on")
-
-    job_doc = Job(
-        status='queued',
-        progress=10,
-        message='Queued for processing',
-        source_type=source_type,
-        original_filename=(file.filename if file else None),
-        sources=(link_list if source_type == 'links' else None),
-        clip_length=str(clip_length),
-        aspect_ratio=str(aspect_ratio),
-        auto_highlights=auto_h,
-        clips=None,
-    ).model_dump()
-
-    job_id = save_job(job_doc)
-
-    # store a timestamp to derive progress over time
-    update_job(job_id, {"created_ts": time.time()})
+    upload_path = None
+    if file:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        upload_path = os.path.join(UPLOAD_DIR, uuid.uuid4().hex + _upload_suffix(file.filename))
+        try:
+            await _spool_upload(file, upload_path)
+        except BaseException:  # includes cancellation on client disconnect
+            _discard_upload(upload_path)
+            raise
+    auto_h = auto_highlights in _TRUTHY
+
+    # Fields mirror schemas.Job; inputs were already validated by the form parser
+    job_doc = {
+        'status': 'queued',
+        'progress': 10,
+        'message': 'Queued for processing',
+        'source_type': source_type,
+        'original_filename': (file.filename if file else None),
+        'upload_path': upload_path,
+        'sources': (list(link_set) if source_type == 'links' else None),
+        'clip_length': str(clip_length),
+        'aspect_ratio': str(aspect_ratio),
+        'auto_highlights': auto_h,
+        'clips': None,
+        'error': None,
+        # wall-clock timestamp used to derive progress over time
+        'created_ns': time.time_ns(),
+    }
+
+    try:
+        job_id = await save_job(job_doc)
+    except BaseException:
+        if upload_path:
+            _discard_upload(upload_path)
+        raise
 
     return {"job_id": job_id}
 
 
+# Completed responses are immutable, so clients may cache them indefinitely
+_COMPLETED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _completed_headers(job_id: str) -> Dict[str, str]:
+    return {'ETag': f'"{job_id}"', 'Cache-Control': _COMPLETED_CACHE_CONTROL}
+
+
+def _completed_response(job_id: str, body: bytes, if_none_match: Optional[str]) -> Response:
+    headers = _completed_headers(job_id)
+    if _etag_matches(if_none_match, job_id):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], job_id: str) -> bool:
+    if not if_none_match:
+        return False
+    etag = f'"{job_id}"'
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
 @app.get("/status/{job_id}")
-async def status(job_id: str):
-    doc = get_job(job_id)
+async def status(job_id: str, request: Request):
+    # Only completed jobs answer If-None-Match; anything else takes the normal path
+    if_none_match = request.headers.get('if-none-match')
+
+    # Parse first: in memory mode this also evicts expired jobs and their cached bodies
+    key = parse_job_id(job_id)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    cached = _cache_get(job_id)
+    if cached is not None:
+        return _completed_response(job_id, cached, if_none_match)
+
+    doc = await get_job(key, _STATUS_PROJECTION)
     if not doc:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    created_ts = float(doc.get('created_ts', time.time()))
-    elapsed = max(0.0, time.time() - created_ts)
-
-    if elapsed < PROCESS_SECONDS:
-        pct = int(min(95, (elapsed / PROCESS_SECONDS) * 90) + 10)
-        update_job(job_id, {
-            'status': 'processing',
-            'progress': pct,
-            'message': 'Analyzing scenes, audio and generating captions…',
-        })
-        return {
-            'status': 'processing',
-            'progress': pct,
-            'message': 'Working on your highlights…',
-        }
-
-    # Completed: create example clips if not already
-    if not doc.get('clips'):
+    # Progress is derived from elapsed time alone; only the terminal state is persisted
+    if doc.get('status') != 'completed':
+        now_ns = time.time_ns()
+        elapsed_ns = max(0, now_ns - _created_ns(doc, now_ns))
+        if elapsed_ns < PROCESS_NS:
+            pct = min(95, (elapsed_ns * 90) // PROCESS_NS) + 10
+            return {
+                'status': 'processing',
+                'progress': pct,
+                'message': 'Working on your highlights…',
+            }
+
+        # Completed: create example clips
         ar = doc.get('aspect_ratio', 'auto')
+        durations = (_clip_duration(doc.get('clip_length')), 20.0)
         example_clips = [
-            Clip(
-                caption='Top moment with highest energy',
-                duration=doc.get('clip_length') if doc.get('clip_length') != 'auto' else 30,
-                aspect_ratio=ar,
-                thumbnail_url='https://images.unsplash.com/photo-1504384308090-c894fdcc538d?q=80&w=1280&auto=format&fit=crop',
-                download_url='https://file-examples.com/storage/fe0e7a8f6e2a6a5ef2d3b5f/2017/04/file_example_MP4_480_1_5MG.mp4',
-            ).model_dump(),
-            Clip(
-                caption='Funny reaction with clean transcript',
-                duration=20,
-                aspect_ratio=ar,
-                thumbnail_url='https://images.unsplash.com/photo-1524253482453-3fed8d2fe12b?q=80&w=1280&auto=format&fit=crop',
-                download_url='https://file-examples.com/storage/fe0e7a8f6e2a6a5ef2d3b5f/2017/04/file_example_MP4_1280_10MG.mp4',
-            ).model_dump(),
+            {**t, 'aspect_ratio': ar, 'duration': dur}
+            for t, dur in zip(_CLIP_TEMPLATES, durations)
         ]
-        update_job(job_id, {
+        doc = await atomic_status_update(key, {
             'status': 'completed',
             'progress': 100,
             'message': 'All done! Your clips are ready.',
             'clips': example_clips,
-        })
-        doc = get_job(job_id)
+        }, _STATUS_PROJECTION)
 
-    return {
+    result = {
         'status': doc.get('status', 'completed'),
         'progress': int(doc.get('progress', 100)),
         'message': doc.get('message', ''),
         'clips': doc.get('clips', []),
     }
+    if result['status'] != 'completed':
+        return result
+    body = orjson.dumps(result)
+    _cache_put(job_id, body)
+    return _completed_response(job_id, body, if_none_match)
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # The in-memory job store is per process, so it needs a single worker
+    workers = 1 if MEM_STORE_ENABLED else int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="auto", http="httptools")
@@ -53,6 +53,7 @@ class Job(BaseModel):
     # Source information
     source_type: Literal['file', 'links']
     original_filename: Optional[str] = None
+    upload_path: Optional[str] = None
     sources: Optional[List[str]] = None
 
     # Options
@@ -0,0 +1,130 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.requests import Request
+
+import main
+
+
+def _request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({'type': 'http', 'method': 'GET', 'headers': raw})
+
+
+def _create_job() -> str:
+    result = asyncio.run(main.process(
+        file=None,
+        source_url='https://example.com/video',
+        sources=None,
+        clip_length='auto',
+        aspect_ratio='auto',
+        auto_highlights='true',
+    ))
+    return result['job_id']
+
+
+def _status(job_id: str, headers=None):
+    return asyncio.run(main.status(job_id, _request(headers)))
+
+
+def _complete(job_id: str):
+    main._mem_update(int(job_id), {'created_ns': 0})
+    return _status(job_id)
+
+
+def _expire_through(job_id: str):
+    for idx in range(main._mem_head, int(job_id) - main._mem_base + 1):
+        main._mem_expires_ns[idx] = 0
+
+
+def _first_live_id() -> int:
+    return main._mem_base + main._mem_head
+
+
+def test_expired_jobs_are_evicted_and_later_ids_still_resolve():
+    first, second = _create_job(), _create_job()
+    assert _complete(first).status_code == 200
+
+    _expire_through(first)
+    with pytest.raises(HTTPException) as exc:
+        _status(first)
+    assert exc.value.status_code == 404
+    assert first not in main._completed_jobs
+    assert _first_live_id() == int(first) + 1
+
+    assert main.parse_job_id(second) == int(second)
+    assert main._mem_row(int(second))['_id'] == second
+    assert _status(second)['status'] == 'processing'
+
+
+def test_eviction_compacts_columns_only_once_half_are_dead():
+    _create_job()
+    survivor = _create_job()
+    _expire_through(str(int(survivor) - 1))
+    main.parse_job_id(survivor)
+    # everything before survivor expired, so the dead prefix was sliced off
+    assert main._mem_head == 0
+    assert main._mem_base == int(survivor)
+
+    later = [_create_job() for _ in range(3)]
+    _expire_through(survivor)
+    assert main.parse_job_id(survivor) is None
+    # one dead row out of four: only the head offset moves
+    assert main._mem_head == 1
+    assert main._mem_base == int(survivor)
+    for job_id in later:
+        assert main.parse_job_id(job_id) == int(job_id)
+        assert main._mem_row(int(job_id))['_id'] == job_id
+
+
+def test_etag_matches_quoted_weak_and_listed_tags():
+    assert main._etag_matches('"42"', '42')
+    assert main._etag_matches('W/"42"', '42')
+    assert main._etag_matches('"7", W/"42"', '42')
+    assert not main._etag_matches('"4"', '42')
+    assert not main._etag_matches('*', '42')
+    assert not main._etag_matches(None, '42')
+
+
+def test_not_modified_only_for_completed_jobs():
+    job_id = _create_job()
+    etag = {'If-None-Match': f'"{job_id}"'}
+    assert _status(job_id, etag)['status'] == 'processing'
+
+    with pytest.raises(HTTPException) as exc:
+        _status('999', {'If-None-Match': '"999"'})
+    assert exc.value.status_code == 404
+
+    completed = _complete(job_id)
+    assert completed.headers['etag'] == f'"{job_id}"'
+    assert _status(job_id, etag).status_code == 304
+
+
+def test_upload_suffix_keeps_only_short_alphanumeric_extensions():
+    assert main._upload_suffix('clip.mp4') == '.mp4'
+    assert main._upload_suffix('x.' + 'a' * 300) == ''
+    assert main._upload_suffix('x.mp\x004') == ''
+    assert main._upload_suffix('x.tar/..') == ''
+    assert main._upload_suffix('noext') == ''
+    assert main._upload_suffix(None) == ''
+
+
+def test_spooled_upload_is_removed_when_save_fails(tmp_path, monkeypatch):
+    async def failing_save(doc):
+        raise RuntimeError('insert failed')
+
+    monkeypatch.setattr(main, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(main, 'save_job', failing_save)
+    upload = UploadFile(file=io.BytesIO(b'video bytes'), filename='clip.mp4')
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.process(
+            file=upload,
+            source_url=None,
+            sources=None,
+            clip_length='auto',
+            aspect_ratio='auto',
+            auto_highlights='true',
+        ))
+    assert list(tmp_path.iterdir()) == []